@@ -1,13 +1,65 @@
+import contextlib
+import functools
+import itertools
 import json
 import logging
 import sqlite3
-from datetime import datetime, timezone
-from typing import Any, List, Dict, Optional
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Collection, List, Dict, Iterator, Optional
 import os
 
+from vote_counter import serialization
 from vote_counter.graphql_client import GraphQLClient
 
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def to_ms_bounds(start_time: datetime, end_time: datetime) -> tuple[int, int]:
+    """
+    Return the inclusive millisecond timestamp bounds of a time range.
+
+    Integer timedelta arithmetic is used so that bounds falling exactly on a
+    millisecond are not shifted by floating point error. Naive datetimes are taken
+    to be in local time, as ``datetime.timestamp`` does.
+    """
+    if start_time.tzinfo is None:
+        start_time = start_time.astimezone()
+    if end_time.tzinfo is None:
+        end_time = end_time.astimezone()
+    start_ms = -((_EPOCH - start_time) // _MILLISECOND)
+    end_ms = (end_time - _EPOCH) // _MILLISECOND
+    return start_ms, end_ms
+
+
+def _check_block_continuity(heights: Collection[int]) -> None:
+    """
+    Check that the given (unique) block heights form a contiguous range.
+
+    Raises:
+        BlockDiscontinuityError: If there is a gap between the block heights.
+    """
+    if not heights:
+        return
+    if max(heights) - min(heights) + 1 == len(heights):
+        return
+
+    # Only sort when there is a gap, to report where it is
+    sorted_heights = sorted(heights)
+    for prev_height, curr_height in itertools.pairwise(sorted_heights):
+        if curr_height != prev_height + 1:
+            raise BlockDiscontinuityError(
+                f"Block height discontinuity detected: {prev_height} to {curr_height}"
+            )
+
+
+def _encode_response(result: Dict[str, Any]) -> bytes:
+    """Encode a GraphQL response as zlib-compressed JSON."""
+    return zlib.compress(serialization.dumps(result))
+
+
 class BlockDiscontinuityError(Exception):
     """Exception raised when there's a discontinuity in block heights."""
 
@@ -18,11 +70,9 @@ class GraphQLQueryAggregator:
     QUERY = """
     query GetTransactions($maxLength: Int!) {
       bestChain(maxLength: $maxLength) {
-        stateHash
         protocolState {
           blockchainState {
             date
-            utcDate
           }
           consensusState {
             blockHeight
@@ -46,6 +96,10 @@ class GraphQLQueryAggregator:
     }
     """
     MAX_LENGTH = 100000000
+    # Fields of a user command that are kept when storing a response
+    USER_COMMAND_FIELDS = ("id", "to", "from", "amount", "fee", "memo", "nonce", "kind")
+    UPSERT_BLOCK = "INSERT INTO blocks (height, date, user_commands, execution_timestamp, endpoint) VALUES (?, ?, ?, ?, ?) ON CONFLICT(height) DO UPDATE SET date = excluded.date, user_commands = excluded.user_commands, execution_timestamp = excluded.execution_timestamp, endpoint = excluded.endpoint WHERE excluded.execution_timestamp >= blocks.execution_timestamp"
+    INSERT_RESPONSE = "INSERT INTO graphql_responses (execution_timestamp, response_blob, min_block_timestamp, max_block_timestamp, endpoint) VALUES (?, ?, ?, ?, ?)"
 
     def __init__(
         self,
@@ -57,57 +111,322 @@ class GraphQLQueryAggregator:
         self.db_path = db_path
         self.recent_blocks_to_ignore = recent_blocks_to_ignore
         self.logger = logging.getLogger(__name__)
+        # Opened on first use and kept until close(), so that its PRAGMAs persist
+        # and each call does not pay the cost of reopening the file
+        self._conn: Optional[sqlite3.Connection] = None
+        # Combined transactions are cached per instance, keyed by the query window
+        # and the id of the most recently stored response. Each cached window holds
+        # every transaction in it, so only a few are kept
+        self._cached_combined_transactions = functools.lru_cache(maxsize=4)(
+            self._load_combined_transactions
+        )
         self._init_db()
 
+    def __enter__(self) -> "GraphQLQueryAggregator":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Return this aggregator's database connection, opening it if needed."""
+        if self._conn is None:
+            # Transactions are managed explicitly with BEGIN/COMMIT
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-262144")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection, if one is open."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS graphql_responses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    execution_timestamp TEXT,
-                    response JSON,
-                    min_block_timestamp TEXT,
-                    max_block_timestamp TEXT,
-                    endpoint TEXT
+        conn = self._get_conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS graphql_responses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                execution_timestamp TEXT,
+                response JSON,
+                min_block_timestamp INTEGER,
+                max_block_timestamp INTEGER,
+                endpoint TEXT
+            )
+        """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_graphql_responses_execution_timestamp ON graphql_responses(execution_timestamp)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_graphql_responses_block_timestamp ON graphql_responses(min_block_timestamp, max_block_timestamp)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_graphql_responses_endpoint ON graphql_responses(endpoint)"
+        )
+        # Most recent version of every block seen in the stored responses
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blocks (
+                height INTEGER PRIMARY KEY,
+                date INTEGER NOT NULL,
+                user_commands BLOB,
+                execution_timestamp TEXT,
+                endpoint TEXT
+            )
+        """
+        )
+        # height is the rowid, so this index also covers (date, height)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_blocks_date ON blocks(date)")
+        self._migrate(conn)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run the enclosed statements in a single transaction."""
+        conn = self._get_conn()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Bring an existing database up to the current schema version."""
+        migrations = [
+            self._migrate_compress_responses,
+            self._migrate_populate_blocks,
+            self._migrate_block_dates,
+        ]
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        # Lets migrations read stored responses with SQLite's JSON1 functions
+        conn.create_function(
+            "decompress_response",
+            1,
+            lambda response_blob: zlib.decompress(response_blob).decode("utf-8"),
+            deterministic=True,
+        )
+
+        for target_version, migration in enumerate(
+            migrations[version:], start=version + 1
+        ):
+            self.logger.info(f"Migrating database to version {target_version}")
+            with self._transaction():
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {target_version}")
+
+    def _migrate_compress_responses(self, conn: sqlite3.Connection) -> None:
+        """
+        Move stored responses into the compressed response_blob column.
+
+        The legacy JSON column is kept (and left NULL) for databases created before
+        this migration.
+        """
+        conn.create_function(
+            "compress_response",
+            1,
+            lambda response: zlib.compress(response.encode("utf-8")),
+            deterministic=True,
+        )
+        conn.execute("ALTER TABLE graphql_responses ADD COLUMN response_blob BLOB")
+        conn.execute(
+            "UPDATE graphql_responses SET response_blob = compress_response(response), response = NULL WHERE response IS NOT NULL"
+        )
+
+    def _migrate_populate_blocks(self, conn: sqlite3.Connection) -> None:
+        """
+        Populate the blocks table from the responses stored before it existed.
+
+        The blocks of every stored response are extracted and deduplicated (most
+        recent response wins) by SQLite's JSON1 functions in a single statement.
+        """
+        conn.execute(
+            """
+            INSERT INTO blocks (height, date, user_commands, execution_timestamp, endpoint)
+            SELECT height, date, user_commands, execution_timestamp, endpoint
+            FROM (
+                SELECT
+                    *,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY height ORDER BY execution_timestamp DESC, id DESC
+                    ) AS version
+                FROM (
+                    SELECT
+                        r.id,
+                        r.execution_timestamp,
+                        r.endpoint,
+                        CAST(json_extract(b.value, '$.protocolState.consensusState.blockHeight') AS INTEGER) AS height,
+                        CAST(json_extract(b.value, '$.protocolState.blockchainState.date') AS INTEGER) AS date,
+                        CAST(json_extract(b.value, '$.transactions.userCommands') AS BLOB) AS user_commands
+                    FROM graphql_responses AS r,
+                        json_each(decompress_response(r.response_blob), '$.bestChain') AS b
                 )
+            )
+            WHERE version = 1
+        """
+        )
+
+    def _migrate_block_dates(self, conn: sqlite3.Connection) -> None:
+        """Set the blockDate of the user commands already stored in the blocks table."""
+        conn.execute(
             """
+            UPDATE blocks
+            SET user_commands = CAST((
+                SELECT json_group_array(json_set(c.value, '$.blockDate', blocks.date))
+                FROM json_each(CAST(blocks.user_commands AS TEXT)) AS c
+            ) AS BLOB)
+        """
+        )
+
+    @classmethod
+    def _project_block(cls, block: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Strip a block down to the fields used when counting votes.
+
+        Responses read from files may carry extra fields (e.g. stateHash, utcDate)
+        that would otherwise be stored and decoded on every read.
+        """
+        protocol_state = block["protocolState"]
+        return {
+            "protocolState": {
+                "blockchainState": {"date": protocol_state["blockchainState"]["date"]},
+                "consensusState": {
+                    "blockHeight": protocol_state["consensusState"]["blockHeight"]
+                },
+            },
+            "transactions": {
+                "userCommands": [
+                    {
+                        field: user_command[field]
+                        for field in cls.USER_COMMAND_FIELDS
+                        if field in user_command
+                    }
+                    for user_command in block["transactions"]["userCommands"]
+                ]
+            },
+        }
+
+    @classmethod
+    def _project_response(cls, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Strip a GraphQL response down to the fields used when counting votes."""
+        return {
+            "bestChain": [
+                cls._project_block(block) for block in result.get("bestChain", [])
+            ]
+        }
+
+    @classmethod
+    def _read_response_file(cls, file_path: str) -> Dict[str, Any]:
+        """Read a GraphQL response from a JSON file, keeping only the fields used."""
+        with open(file_path, "rb") as f:
+            return cls._project_response(serialization.loads(f.read()))
+
+    @staticmethod
+    def _parse_blocks(result: Dict[str, Any]) -> List[tuple[int, int, Dict[str, Any]]]:
+        """Return the (height, date, block) of every block in a GraphQL response."""
+        blocks = []
+        for block in result.get("bestChain", []):
+            protocol_state = block["protocolState"]
+            blocks.append(
+                (
+                    int(protocol_state["consensusState"]["blockHeight"]),
+                    int(protocol_state["blockchainState"]["date"]),
+                    block,
+                )
             )
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_graphql_responses_execution_timestamp ON graphql_responses(execution_timestamp)"
+        return blocks
+
+    @staticmethod
+    def _build_row(
+        result: Dict[str, Any],
+        blocks: List[tuple[int, int, Dict[str, Any]]],
+        execution_timestamp: str,
+        endpoint: str,
+    ) -> tuple:
+        """Build the graphql_responses row for a single GraphQL response."""
+        block_timestamps = [block_timestamp for _, block_timestamp, _ in blocks]
+
+        return (
+            execution_timestamp,
+            _encode_response(result),
+            min(block_timestamps, default=None),
+            max(block_timestamps, default=None),
+            endpoint,
+        )
+
+    @staticmethod
+    def _build_block_rows(
+        blocks: List[tuple[int, int, Dict[str, Any]]],
+        execution_timestamp: str,
+        endpoint: str,
+    ) -> List[tuple]:
+        """
+        Build the blocks rows for a single GraphQL response.
+
+        Each user command is stored with its blockDate already set, so reads only
+        have to decode them.
+        """
+        return [
+            (
+                block_height,
+                block_timestamp,
+                serialization.dumps(
+                    [
+                        {**user_command, "blockDate": block_timestamp}
+                        for user_command in block["transactions"]["userCommands"]
+                    ]
+                ),
+                execution_timestamp,
+                endpoint,
             )
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_graphql_responses_block_timestamp ON graphql_responses(min_block_timestamp, max_block_timestamp)"
+            for block_height, block_timestamp, block in blocks
+        ]
+
+    def _store_responses(
+        self, responses: List[tuple[Dict[str, Any], str, str]]
+    ) -> None:
+        """
+        Store GraphQL responses and their blocks in a single transaction.
+
+        Args:
+            responses (List[tuple[Dict[str, Any], str, str]]): (projected result,
+                execution timestamp, endpoint) for each response to store.
+        """
+        response_rows = []
+        block_rows = []
+        for result, execution_timestamp, endpoint in responses:
+            blocks = self._parse_blocks(result)
+            response_rows.append(
+                self._build_row(result, blocks, execution_timestamp, endpoint)
             )
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_graphql_responses_endpoint ON graphql_responses(endpoint)"
+            block_rows.extend(
+                self._build_block_rows(blocks, execution_timestamp, endpoint)
             )
 
+        with self._transaction() as conn:
+            conn.executemany(self.INSERT_RESPONSE, response_rows)
+            conn.executemany(self.UPSERT_BLOCK, block_rows)
+
     def retrieve_and_store(self):
         result = self.client.execute_query(self.QUERY, {"maxLength": self.MAX_LENGTH})
 
         execution_timestamp = datetime.now(timezone.utc).isoformat()
-        min_block_timestamp = None
-        max_block_timestamp = None
-
-        for block in result["bestChain"]:
-            block_timestamp = int(block["protocolState"]["blockchainState"]["date"])
-            if min_block_timestamp is None or block_timestamp < min_block_timestamp:
-                min_block_timestamp = block_timestamp
-            if max_block_timestamp is None or block_timestamp > max_block_timestamp:
-                max_block_timestamp = block_timestamp
-
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT INTO graphql_responses (execution_timestamp, response, min_block_timestamp, max_block_timestamp, endpoint) VALUES (?, ?, ?, ?, ?)",
+        self._store_responses(
+            [
                 (
+                    self._project_response(result),
                     execution_timestamp,
-                    json.dumps(result),
-                    min_block_timestamp,
-                    max_block_timestamp,
                     self.client.endpoint,
-                ),
-            )
+                )
+            ]
+        )
 
         self.logger.info(
             f"Stored GraphQL response with execution timestamp: {execution_timestamp}"
@@ -120,161 +439,185 @@ class GraphQLQueryAggregator:
         Args:
             file_path (str): Path to the JSON file containing the GraphQL response.
         """
-        self.logger.info(f"Retrieving GraphQL response from file: {file_path}")
+        self.retrieve_and_store_from_files([file_path])
 
-        try:
-            with open(file_path, "r") as f:
-                result = json.load(f)
-        except FileNotFoundError:
-            self.logger.error(f"File not found: {file_path}")
-            raise
-        except json.JSONDecodeError:
-            self.logger.error(f"Invalid JSON in file: {file_path}")
-            raise
+    def retrieve_and_store_from_files(self, file_paths: List[str]) -> None:
+        """
+        Retrieve GraphQL responses from JSON files and store them in the database.
 
-        execution_timestamp = datetime.now(timezone.utc).isoformat()
-        min_block_timestamp = None
-        max_block_timestamp = None
+        All responses are inserted in a single transaction.
 
-        for block in result.get("bestChain", []):
-            block_timestamp = int(block["protocolState"]["blockchainState"]["date"])
-            if min_block_timestamp is None or block_timestamp < min_block_timestamp:
-                min_block_timestamp = block_timestamp
-            if max_block_timestamp is None or block_timestamp > max_block_timestamp:
-                max_block_timestamp = block_timestamp
-
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT INTO graphql_responses (execution_timestamp, response, min_block_timestamp, max_block_timestamp, endpoint) VALUES (?, ?, ?, ?, ?)",
-                (
-                    execution_timestamp,
-                    json.dumps(result),
-                    min_block_timestamp,
-                    max_block_timestamp,
-                    os.path.abspath(
-                        file_path
-                    ),  # Use the full path of the file as the endpoint
-                ),
+        Args:
+            file_paths (List[str]): Paths to the JSON files containing the GraphQL responses.
+        """
+        responses = []
+        for file_path in file_paths:
+            self.logger.info(f"Retrieving GraphQL response from file: {file_path}")
+
+            try:
+                result = self._read_response_file(file_path)
+            except FileNotFoundError:
+                self.logger.error(f"File not found: {file_path}")
+                raise
+            except json.JSONDecodeError:
+                self.logger.error(f"Invalid JSON in file: {file_path}")
+                raise
+
+            execution_timestamp = datetime.now(timezone.utc).isoformat()
+            # Use the full path of the file as the endpoint
+            responses.append((result, execution_timestamp, os.path.abspath(file_path)))
+
+        self._store_responses(responses)
+
+        for _, execution_timestamp, _ in responses:
+            self.logger.info(
+                f"Stored GraphQL response from file with execution timestamp: {execution_timestamp}"
             )
 
-        self.logger.info(
-            f"Stored GraphQL response from file with execution timestamp: {execution_timestamp}"
-        )
-
     @staticmethod
     def _get_transactions_from_response(
         responses: list[dict],
         start_time: datetime,
         end_time: datetime,
         recent_blocks_to_ignore: int,
-        logger: logging.Logger,
+        logger: logging.Logger = logging.getLogger(__name__),
     ) -> List[Dict[str, Any]]:
+        """
+        Combine the transactions of in-memory GraphQL responses.
+
+        This mirrors what retrieve_combined_transactions does for the responses
+        stored in the database. ``responses`` must be ordered from oldest to most
+        recent, the order in which they are stored; for heights present in several
+        responses the most recent one wins.
+        """
         combined_transactions = []
         all_blocks = {}
-
-        # Sort responses by execution timestamp (most recent first)
-        sorted_responses = sorted(
-            responses, key=lambda r: r.get("execution_timestamp", ""), reverse=True
-        )
+        start_ms, end_ms = to_ms_bounds(start_time, end_time)
 
         # Collect blocks from all responses, keeping only the most recent version of each block
-        for response in sorted_responses:
-            for block in response["bestChain"]:
-                block_height = int(
-                    block["protocolState"]["consensusState"]["blockHeight"]
-                )
+        for response in reversed(responses):
+            blocks = GraphQLQueryAggregator._parse_blocks(response)
+            for block_height, block_timestamp, block in blocks:
                 if block_height not in all_blocks:
-                    all_blocks[block_height] = block
+                    all_blocks[block_height] = (block_timestamp, block)
 
-        # Convert the dictionary to a sorted list
-        sorted_blocks = sorted(
-            all_blocks.values(),
-            key=lambda b: int(b["protocolState"]["consensusState"]["blockHeight"]),
-        )
+        if not all_blocks:
+            logger.info("No blocks found in the responses")
+            return combined_transactions
 
         # Log the oldest and most recent block times and block numbers
-        if sorted_blocks:
-            oldest_block = sorted_blocks[0]
-            newest_block = sorted_blocks[-1]
-
-            oldest_block_time = datetime.fromtimestamp(
-                int(oldest_block["protocolState"]["blockchainState"]["date"]) / 1000,
-                tz=timezone.utc,
-            )
-            oldest_block_number = int(
-                oldest_block["protocolState"]["consensusState"]["blockHeight"]
-            )
+        oldest_block_number = min(all_blocks)
+        newest_block_number = max(all_blocks)
 
-            newest_block_time = datetime.fromtimestamp(
-                int(newest_block["protocolState"]["blockchainState"]["date"]) / 1000,
-                tz=timezone.utc,
-            )
-            newest_block_number = int(
-                newest_block["protocolState"]["consensusState"]["blockHeight"]
-            )
+        oldest_block_time = datetime.fromtimestamp(
+            all_blocks[oldest_block_number][0] / 1000, tz=timezone.utc
+        )
+        newest_block_time = datetime.fromtimestamp(
+            all_blocks[newest_block_number][0] / 1000, tz=timezone.utc
+        )
 
-            logger.info(
-                f"Oldest block time (UTC): {oldest_block_time.isoformat()}, Block number: {oldest_block_number}"
-            )
-            logger.info(
-                f"Newest block time (UTC): {newest_block_time.isoformat()}, Block number: {newest_block_number}"
-            )
-        else:
-            logger.info("No blocks found in the responses")
+        logger.info(
+            f"Oldest block time (UTC): {oldest_block_time.isoformat()}, Block number: {oldest_block_number}"
+        )
+        logger.info(
+            f"Newest block time (UTC): {newest_block_time.isoformat()}, Block number: {newest_block_number}"
+        )
 
-        # Check for block continuity
-        for i in range(1, len(sorted_blocks)):
-            prev_height = int(
-                sorted_blocks[i - 1]["protocolState"]["consensusState"]["blockHeight"]
-            )
-            curr_height = int(
-                sorted_blocks[i]["protocolState"]["consensusState"]["blockHeight"]
-            )
-            if curr_height != prev_height + 1:
-                raise BlockDiscontinuityError(
-                    f"Block height discontinuity detected: {prev_height} to {curr_height}"
-                )
+        _check_block_continuity(all_blocks.keys())
 
-        # Process blocks within the time range
-        for block in (
-            sorted_blocks[:-recent_blocks_to_ignore]
-            if recent_blocks_to_ignore > 0
-            else sorted_blocks
+        # Process blocks within the time range, in height order
+        for block_height in range(
+            oldest_block_number, newest_block_number - recent_blocks_to_ignore + 1
         ):
-            block_timestamp = int(block["protocolState"]["blockchainState"]["date"])
+            block_timestamp, block = all_blocks[block_height]
 
-            if (
-                start_time.timestamp() * 1000
-                <= block_timestamp
-                <= end_time.timestamp() * 1000
-            ):
+            if start_ms <= block_timestamp <= end_ms:
                 for tx in block["transactions"]["userCommands"]:
                     tx["blockDate"] = block_timestamp
                     combined_transactions.append(tx)
 
         return combined_transactions
 
+    def _load_combined_transactions(
+        self, start_time: datetime, end_time: datetime, last_response_id: int | None
+    ) -> tuple[Dict[str, Any], ...]:
+        """
+        Load the combined transactions for the given time range from the database.
+
+        ``last_response_id`` is not used in the query; it is part of the cache key so
+        that storing a new response invalidates previously cached results.
+        """
+        return tuple(self.iter_combined_transactions(start_time, end_time))
+
+    def iter_combined_transactions(
+        self, start_time: datetime, end_time: datetime
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield the combined transactions for the given time range, in block order.
+
+        Unlike ``retrieve_combined_transactions`` the transactions are neither cached
+        nor collected into a list, so a consumer that keeps only some of them needs
+        memory for those alone. Block continuity is checked once every block has been
+        read, so ``BlockDiscontinuityError`` is raised at the end of the iteration.
+        """
+        start_ms, end_ms = to_ms_bounds(start_time, end_time)
+        conn = self._get_conn()
+        # The height range of the window is read from the date index alone, which
+        # also covers the height. The blocks are then scanned in height order on
+        # the table itself, so SQLite returns each row as it is read instead of
+        # first copying every block's user commands into a sorter
+        min_height, max_height = conn.execute(
+            "SELECT MIN(height), MIN(MAX(height), (SELECT MAX(height) FROM blocks) - ?) FROM blocks WHERE date BETWEEN ? AND ?",
+            (self.recent_blocks_to_ignore, start_ms, end_ms),
+        ).fetchone()
+        cursor = conn.execute(
+            "SELECT height, date, user_commands FROM blocks NOT INDEXED WHERE height BETWEEN ? AND ? AND date BETWEEN ? AND ? ORDER BY height",
+            (min_height, max_height, start_ms, end_ms),
+        )
+
+        # Only the first and last blocks, and the first gap between heights, are
+        # kept; each block's user commands are decoded as it is read
+        oldest: tuple[int, int] | None = None
+        newest: tuple[int, int] | None = None
+        gap: tuple[int, int] | None = None
+        for height, date, user_commands in cursor:
+            if newest is None:
+                oldest = (height, date)
+            elif gap is None and height != newest[0] + 1:
+                gap = (newest[0], height)
+            newest = (height, date)
+            yield from serialization.loads(user_commands)
+
+        if oldest is not None:
+            self.logger.info(
+                f"Oldest block time (UTC): {datetime.fromtimestamp(oldest[1] / 1000, tz=timezone.utc).isoformat()}, Block number: {oldest[0]}"
+            )
+            self.logger.info(
+                f"Newest block time (UTC): {datetime.fromtimestamp(newest[1] / 1000, tz=timezone.utc).isoformat()}, Block number: {newest[0]}"
+            )
+        else:
+            self.logger.info("No blocks found in the requested time range")
+
+        if gap is not None:
+            raise BlockDiscontinuityError(
+                f"Block height discontinuity detected: {gap[0]} to {gap[1]}"
+            )
+
     def retrieve_combined_transactions(
         self, start_time: datetime, end_time: datetime
     ) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "SELECT response FROM graphql_responses WHERE min_block_timestamp <= ? AND max_block_timestamp >= ? ORDER BY execution_timestamp",
-                (
-                    end_time.timestamp() * 1000,
-                    start_time.timestamp() * 1000,
-                ),
-            )
-            responses: list[str] = cursor.fetchall()
-            responses_as_dicts = [json.loads(response[0]) for response in responses]
-
-        combined_transactions = self._get_transactions_from_response(
-            responses_as_dicts,
-            start_time,
-            end_time,
-            self.recent_blocks_to_ignore,
-            self.logger,
+        (last_response_id,) = (
+            self._get_conn().execute("SELECT MAX(id) FROM graphql_responses").fetchone()
         )
+        # The cached transactions are shared between calls, so each caller gets its
+        # own copies to modify. Their values are all strings and integers, so a
+        # shallow copy is enough
+        combined_transactions = [
+            dict(tx)
+            for tx in self._cached_combined_transactions(
+                start_time, end_time, last_response_id
+            )
+        ]
 
         # Log the total number of transactions retrieved
         self.logger.info(
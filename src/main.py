@@ -19,6 +19,24 @@ from gqa.graphql_query_aggregator import GraphQLQueryAggregator, BlockDiscontinu
 from vote_counter.stake_counter import StakeCountingPipeline
 
 
+_CLIENTS: dict[str, GraphQLClient] = {}
+
+
+def get_client(endpoint: str) -> GraphQLClient:
+    """Return the GraphQL client for an endpoint, reusing it across calls."""
+    client = _CLIENTS.get(endpoint)
+    if client is None:
+        client = _CLIENTS[endpoint] = GraphQLClient(endpoint)
+    return client
+
+
+def close_clients() -> None:
+    """Close the GraphQL clients created by get_client."""
+    while _CLIENTS:
+        _, client = _CLIENTS.popitem()
+        client.close()
+
+
 def setup_logging(verbose: bool = False) -> None:
     """Set up logging configuration."""
     level = logging.DEBUG if verbose else logging.INFO
@@ -46,7 +64,10 @@ def parse_arguments() -> argparse.Namespace:
     # Aggregate command
     aggregate_parser = subparsers.add_parser("aggregate", help="Aggregate GraphQL data")
     aggregate_parser.add_argument(
-        "--file", help="Path to JSON file containing GraphQL response", type=str
+        "--file",
+        help="Path(s) to JSON file(s) containing GraphQL responses",
+        type=str,
+        nargs="+",
     )
 
     # Count command
@@ -83,18 +104,17 @@ def parse_arguments() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def run_query_aggregator(config: Config, file_path: str | None = None) -> None:
+def run_query_aggregator(config: Config, file_paths: list[str] | None = None) -> None:
     """Run the Query Aggregator mode."""
     logger = logging.getLogger(__name__)
-    client = GraphQLClient(config.GRAPHQL_ENDPOINT)
-    gqa = GraphQLQueryAggregator(client, config.DB_PATH)
-
-    if file_path:
-        logger.info(f"Aggregating data from file: {file_path}")
-        gqa.retrieve_and_store_from_file(file_path)
-    else:
-        logger.info("Aggregating data from GraphQL endpoint")
-        gqa.retrieve_and_store()
+    client = get_client(config.GRAPHQL_ENDPOINT)
+    with GraphQLQueryAggregator(client, config.DB_PATH) as gqa:
+        if file_paths:
+            logger.info(f"Aggregating data from files: {', '.join(file_paths)}")
+            gqa.retrieve_and_store_from_files(file_paths)
+        else:
+            logger.info("Aggregating data from GraphQL endpoint")
+            gqa.retrieve_and_store()
 
     logger.info("Query aggregation completed successfully")
 
@@ -109,20 +129,22 @@ def run_vote_counting(args: argparse.Namespace, config: Config) -> None:
     logger.info(f"Start date: {start_date}")
     logger.info(f"End date: {end_date}")
 
-    client = GraphQLClient(config.GRAPHQL_ENDPOINT)
-    gqa = GraphQLQueryAggregator(client, config.DB_PATH)
-    pipeline = VoteCountingPipeline(start_date, end_date, gqa, config)
-
-    try:
-        vote_counts = pipeline.run()
-        output_file = args.output or config.OUTPUT_FILE
-        pipeline.save_results(vote_counts, output_file)
-        logger.info(
-            f"Vote counting completed successfully. Results saved to {output_file}"
+    client = get_client(config.GRAPHQL_ENDPOINT)
+    with GraphQLQueryAggregator(client, config.DB_PATH) as gqa:
+        pipeline = VoteCountingPipeline(
+            start_date, end_date, gqa, config, stream_transactions=True
         )
-    except BlockDiscontinuityError as e:
-        logger.error(f"Vote counting failed due to block discontinuity: {str(e)}")
-        sys.exit(1)
+
+        try:
+            vote_counts = pipeline.run()
+            output_file = args.output or config.OUTPUT_FILE
+            pipeline.save_results(vote_counts, output_file)
+            logger.info(
+                f"Vote counting completed successfully. Results saved to {output_file}"
+            )
+        except BlockDiscontinuityError as e:
+            logger.error(f"Vote counting failed due to block discontinuity: {str(e)}")
+            sys.exit(1)
 
 
 def run_stake_counting(args: argparse.Namespace, config: Config) -> None:
@@ -132,7 +154,7 @@ def run_stake_counting(args: argparse.Namespace, config: Config) -> None:
     logger.info(f"Input file: {args.input}")
     logger.info(f"Output file: {args.output}")
 
-    client = GraphQLClient(config.GRAPHQL_ENDPOINT)
+    client = get_client(config.GRAPHQL_ENDPOINT)
     pipeline = StakeCountingPipeline(client, config)
 
     try:
@@ -164,6 +186,8 @@ def main() -> None:
     except Exception as e:
         logger.exception(f"An error occurred: {str(e)}")
         sys.exit(1)
+    finally:
+        close_clients()
 
 
 if __name__ == "__main__":
@@ -2,19 +2,48 @@
 
 import json
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from gql import gql, Client
+from gql.client import SyncClientSession
 from gql.transport.requests import RequestsHTTPTransport
+from graphql import DocumentNode
 
 
 class GraphQLClient:
     """GraphQL client for querying the Mina blockchain."""
 
+    # Number of times a failed HTTP request is retried
+    RETRIES = 3
+    # Timeout, in seconds, of a single HTTP request; generous because the
+    # aggregator's bestChain query returns the whole chain
+    TIMEOUT = 300
+
     def __init__(self, endpoint: str):
         self.endpoint = endpoint
         self.logger = logging.getLogger(__name__)
-        transport = RequestsHTTPTransport(url=self.endpoint)
-        self.client = Client(transport=transport, fetch_schema_from_transport=True)
+        transport = RequestsHTTPTransport(
+            url=self.endpoint, retries=self.RETRIES, timeout=self.TIMEOUT
+        )
+        # Queries are validated by the endpoint, so the schema is not fetched
+        self.client = Client(transport=transport, fetch_schema_from_transport=False)
+        self._session: Optional[SyncClientSession] = None
+
+    def _get_session(self) -> SyncClientSession:
+        """
+        Return the connected client session, connecting on first use.
+
+        Keeping the session open reuses the underlying HTTP connection across
+        queries instead of reconnecting for each one.
+        """
+        if self._session is None:
+            self._session = self.client.connect_sync()
+        return self._session
+
+    def close(self) -> None:
+        """Close the client session, if one is open."""
+        if self._session is not None:
+            self.client.close_sync()
+            self._session = None
 
     def execute_query(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -27,12 +56,34 @@ class GraphQLClient:
         Returns:
             Dict[str, Any]: The query result.
         """
-        self.logger.info(f"Executing GraphQL query: {query[:50]}...")
-        self.logger.debug(f"Query variables: {variables}")
+        self.logger.info("Executing GraphQL query: %s...", query[:50])
+        return self.execute_document(gql(query), variables)
+
+    def execute_document(
+        self, document: DocumentNode, variables: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Execute an already parsed GraphQL query.
+
+        Queries that are run repeatedly can be parsed once with ``gql`` and executed
+        with this method, instead of being parsed again on every call.
+
+        Args:
+            document (DocumentNode): The parsed GraphQL query.
+            variables (Dict[str, Any]): Variables for the query.
+
+        Returns:
+            Dict[str, Any]: The query result.
+        """
+        # Results can be very large, so they are only formatted when DEBUG is enabled
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug("Query variables: %r", variables)
         try:
-            result = self.client.execute(gql(query), variable_values=variables)
-            self.logger.debug(f"Query result: {result}")
+            result = self._get_session().execute(document, variable_values=variables)
+            if debug:
+                self.logger.debug("Query result: %r", result)
             return result
         except Exception as e:
-            self.logger.exception(f"Error executing GraphQL query: {str(e)}")
+            self.logger.exception("Error executing GraphQL query: %s", e)
             raise
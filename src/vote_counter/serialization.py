@@ -0,0 +1,72 @@
+"""JSON serialization helpers for the GovBot Vote Counter.
+
+orjson is used when it is installed and the standard library json module
+otherwise; both produce and accept the same JSON documents.
+"""
+
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson is in the Pipfile; json keeps this usable without it
+    orjson = None
+
+
+def dumps(
+    obj: Any,
+    *,
+    indent: bool = False,
+    sort_keys: bool = False,
+) -> bytes:
+    """
+    Serialize an object to UTF-8 encoded JSON.
+
+    Args:
+        obj (Any): The object to serialize.
+        indent (bool): Pretty-print the output with an indentation of two spaces.
+        sort_keys (bool): Output the keys of dictionaries in sorted order.
+    """
+    if orjson is not None:
+        option = 0
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option or None)
+    # ensure_ascii=False writes non-ASCII characters as UTF-8, like orjson
+    return json.dumps(
+        obj,
+        indent=2 if indent else None,
+        sort_keys=sort_keys,
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    """Deserialize a JSON document."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def jsonify(obj: Any) -> Any:
+    """
+    Convert an object into one made only of JSON types, in a single pass.
+
+    Decimals become strings, sets become sorted lists and datetimes become ISO 8601
+    strings, so the result can be serialized without a ``default`` callback.
+    """
+    if isinstance(obj, dict):
+        return {key: jsonify(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [jsonify(value) for value in obj]
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return sorted(jsonify(value) for value in obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return obj
@@ -1,17 +1,42 @@
 """Stake counting module for the GovBot Vote Counter."""
 
-import json
+import functools
 import logging
 from decimal import Decimal
-from typing import Any, Dict
+from typing import Any, Dict, Iterable
 
+from gql import gql
+from graphql import DocumentNode
+
+from vote_counter import serialization
 from vote_counter.graphql_client import GraphQLClient
 from vote_counter.config import Config
 
 
+@functools.lru_cache(maxsize=None)
+def _balances_query(batch_size: int) -> DocumentNode:
+    """
+    Return the parsed query fetching the balances of ``batch_size`` accounts.
+
+    Every batch but the last has the same size, so each query is only built and
+    parsed once.
+    """
+    variable_definitions = ", ".join(
+        f"$publicKey{i}: PublicKey!" for i in range(batch_size)
+    )
+    accounts = "\n".join(
+        f"  account{i}: account(publicKey: $publicKey{i}) {{ balance {{ total }} }}"
+        for i in range(batch_size)
+    )
+    return gql(f"query StakingInfo({variable_definitions}) {{\n{accounts}\n}}")
+
+
 class StakeCountingPipeline:
     """Pipeline for counting vote stakes."""
 
+    # Number of account balances fetched per GraphQL query
+    BALANCE_BATCH_SIZE = 100
+
     def __init__(self, graphql_client: GraphQLClient, config: Config):
         self.client = graphql_client
         self.config = config
@@ -30,48 +55,75 @@ class StakeCountingPipeline:
 
     def load_vote_counts(self, input_file: str) -> Dict[str, Any]:
         """Load vote counts from the input file."""
-        with open(input_file, "r") as f:
-            return json.load(f)
+        with open(input_file, "rb") as f:
+            return serialization.loads(f.read())
 
     def count_stakes(self, vote_counts: Dict[str, Any]) -> Dict[str, Any]:
         """Count stakes for each vote."""
         stake_info = {}
         total_supply = self.get_total_supply()
+        # Fetch every voter's balance up front, once per address
+        balances = self.get_account_balances(
+            address
+            for votes in vote_counts.values()
+            for vote_type in ("yes_votes", "no_votes")
+            for address in votes[vote_type]["addresses"]
+        )
 
         for project_id, votes in vote_counts.items():
             stake_info[project_id] = {
-                "yes_votes": self.get_stake_info(votes["yes_votes"], total_supply),
-                "no_votes": self.get_stake_info(votes["no_votes"], total_supply),
+                "yes_votes": self.get_stake_info(
+                    votes["yes_votes"], total_supply, balances
+                ),
+                "no_votes": self.get_stake_info(
+                    votes["no_votes"], total_supply, balances
+                ),
             }
 
         return stake_info
 
     def get_stake_info(
-        self, votes: Dict[str, Any], total_supply: Decimal
+        self,
+        votes: Dict[str, Any],
+        total_supply: int,
+        balances: Dict[str, int] | None = None,
     ) -> Dict[str, Any]:
-        """Get stake information for a set of votes."""
+        """
+        Get stake information for a set of votes.
+
+        Balances missing from ``balances`` are queried one address at a time.
+        Balances are summed as integer nanomina; the reported amounts and
+        percentages are Decimals, as before. Percentages are computed as
+        ``(balance / total_supply) * 100`` in that order, which determines the
+        exponent of the Decimal and so the saved text (e.g. "30.0").
+        """
+        balances = balances or {}
+        supply = Decimal(total_supply)
         addresses = votes["addresses"]
-        stake_info = {
-            "count": votes["count"],
-            "addresses": addresses,
-            "stake": {"addresses": {}, "total": Decimal(0), "percent": Decimal(0)},
-        }
+        stake_addresses = {}
+        total = 0
 
         for address in addresses:
-            balance = self.get_account_balance(address)
-            percent = (balance / total_supply) * 100
-            stake_info["stake"]["addresses"][address] = {
-                "balance": balance,
-                "percent": percent,
+            balance = balances.get(address)
+            if balance is None:
+                balance = self.get_account_balance(address)
+            stake_addresses[address] = {
+                "balance": Decimal(balance),
+                "percent": (Decimal(balance) / supply) * 100,
             }
-            stake_info["stake"]["total"] += balance
+            total += balance
 
-        stake_info["stake"]["percent"] = (
-            stake_info["stake"]["total"] / total_supply
-        ) * 100
-        return stake_info
+        return {
+            "count": votes["count"],
+            "addresses": addresses,
+            "stake": {
+                "addresses": stake_addresses,
+                "total": Decimal(total),
+                "percent": (Decimal(total) / supply) * 100,
+            },
+        }
 
-    def get_account_balance(self, address: str) -> Decimal:
+    def get_account_balance(self, address: str) -> int:
         """Get the balance of an account using GraphQL query."""
         query = """
         query StakingInfo($publicKey: PublicKey!) {
@@ -84,9 +136,31 @@ class StakeCountingPipeline:
         """
         variables = {"publicKey": address}
         result = self.client.execute_query(query, variables)
-        return Decimal(result["account"]["balance"]["total"])
+        return int(result["account"]["balance"]["total"])
+
+    def get_account_balances(self, addresses: Iterable[str]) -> Dict[str, int]:
+        """
+        Get the balances of several accounts, batching them into GraphQL queries.
+
+        Each query fetches up to BALANCE_BATCH_SIZE accounts using field aliases,
+        instead of one round trip per account.
+        """
+        unique_addresses = list(dict.fromkeys(addresses))
+        balances: Dict[str, int] = {}
+
+        for start in range(0, len(unique_addresses), self.BALANCE_BATCH_SIZE):
+            batch = unique_addresses[start : start + self.BALANCE_BATCH_SIZE]
+            variables = {f"publicKey{i}": address for i, address in enumerate(batch)}
+
+            result = self.client.execute_document(
+                _balances_query(len(batch)), variables
+            )
+            for i, address in enumerate(batch):
+                balances[address] = int(result[f"account{i}"]["balance"]["total"])
+
+        return balances
 
-    def get_total_supply(self) -> Decimal:
+    def get_total_supply(self) -> int:
         """Get the total circulating currency using GraphQL query."""
         query = """
         query getTotalCurrency {
@@ -100,12 +174,12 @@ class StakeCountingPipeline:
         }
         """
         result = self.client.execute_query(query, {})
-        return Decimal(
+        return int(
             result["bestChain"][0]["protocolState"]["consensusState"]["totalCurrency"]
         )
 
     def save_results(self, stake_info: Dict[str, Any], output_file: str) -> None:
         """Save stake counting results to a JSON file."""
-        with open(output_file, "w") as f:
-            json.dump(stake_info, f, indent=2, default=str)
+        with open(output_file, "wb") as f:
+            f.write(serialization.dumps(serialization.jsonify(stake_info), indent=True))
         self.logger.info(f"Stake information saved to {output_file}")
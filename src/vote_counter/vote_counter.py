@@ -1,21 +1,98 @@
 """Vote counting module for the GovBot Vote Counter."""
 
-import json
+import functools
 import logging
+import re
+import sys
 from datetime import datetime, timezone
-from decimal import Decimal
-from typing import Any, List, Optional
-from collections import defaultdict
+from typing import Any, Iterable, Iterator, List, NamedTuple
+
 import base58
 
+from vote_counter import serialization
 from vote_counter.graphql_client import GraphQLClient
 from vote_counter.config import Config
-from gqa.graphql_query_aggregator import GraphQLQueryAggregator, BlockDiscontinuityError
+from gqa.graphql_query_aggregator import (
+    GraphQLQueryAggregator,
+    BlockDiscontinuityError,
+    to_ms_bounds,
+)
 
 
 type VoteCount = dict[str, dict[str, Any]]
 
 
+# A vote memo: "yes" or "no" followed by the project ID
+_MEMO_PATTERN: re.Pattern[str] = re.compile(r"\s*(yes|no)\s+(\d+)\s*")
+
+
+class Vote(NamedTuple):
+    """A valid vote transaction, as kept by the vote counting pipeline."""
+
+    id: str
+    sender: str
+    memo: str
+    vote: str
+    project_id: int
+    nonce: int
+    block_date: int
+
+
+logger = logging.getLogger(__name__)
+
+# Number of distinct memos whose decoding is cached; bounded because any payment to
+# the burn address can carry an arbitrary memo
+_MEMO_CACHE_SIZE = 1 << 16
+
+
+def _decode_memo(memo: str) -> str:
+    """Decode the Base58Check encoded memo."""
+    debug: bool = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug(f"Decoding memo: {memo}")
+
+    try:
+        # Decode from Base58Check
+        decoded: bytes = base58.b58decode_check(memo)
+        if debug:
+            logger.debug(f"Base58Check decoded: {decoded.hex()}")
+
+        # Check the version byte (should be 0x14)
+        if decoded[0] != 0x14:
+            raise ValueError(f"Invalid memo version byte: {decoded[0]}")
+
+        # Get the length of the message (third byte) --> Docs mention byte 2, but this appears to be incorrect
+        length: int = decoded[2]
+
+        # Extract the actual message
+        message: str = decoded[3 : 3 + length].decode("utf-8")
+        if debug:
+            logger.debug(f"Memo length: {length}, decoded message: {message}")
+        return message
+    except Exception as e:
+        logger.error("Error decoding memo: %s", e)
+        return ""  # Return an empty string if decoding fails
+
+
+# Voters reuse a small set of memos ("yes 1", "no 1", ...), so parsed memos are
+# cached instead of repeating the Base58Check decoding for every transaction
+@functools.lru_cache(maxsize=_MEMO_CACHE_SIZE)
+def _parse_vote_memo(memo: str) -> tuple[str, tuple[str, int] | None]:
+    """
+    Decode a memo and parse it as a vote.
+
+    Returns:
+        tuple[str, tuple[str, int] | None]: The decoded memo, and the vote ("yes" or
+        "no") and project ID, or None if the memo is not a valid vote.
+    """
+    decoded: str = _decode_memo(memo)
+    match: re.Match[str] | None = _MEMO_PATTERN.fullmatch(decoded)
+    if match is None:
+        return decoded, None
+    vote, project_id = match.groups()
+    return decoded, (vote, int(project_id))
+
+
 class VoteCountingPipeline:
     """Pipeline for counting votes."""
 
@@ -29,6 +106,7 @@ class VoteCountingPipeline:
         "nonce",
         "kind",
     ]
+    REQUIRED_TX_FIELDS_SET: frozenset[str] = frozenset(REQUIRED_TX_FIELDS)
 
     def __init__(
         self,
@@ -36,12 +114,18 @@ class VoteCountingPipeline:
         end_date: datetime,
         gqa: GraphQLQueryAggregator,
         config: Config,
+        stream_transactions: bool = False,
     ) -> None:
         self.start_date: datetime = start_date
         self.end_date: datetime = end_date
         self.gqa: GraphQLQueryAggregator = gqa
         self.config: Config = config
+        # Whether transactions are streamed from the GQA rather than retrieved as a
+        # list, keeping memory proportional to the number of votes
+        self.stream_transactions: bool = stream_transactions
         self.logger: logging.Logger = logging.getLogger(__name__)
+        # Block dates are millisecond timestamps, compared against these bounds
+        self.start_ms, self.end_ms = to_ms_bounds(start_date, end_date)
 
     def run(self) -> VoteCount:
         """Execute the vote counting pipeline."""
@@ -49,15 +133,10 @@ class VoteCountingPipeline:
             f"Starting vote counting pipeline from {self.start_date} to {self.end_date}"
         )
 
-        transactions: List[dict[str, Any]] = self.get_transactions()
-        filtered_transactions: List[dict[str, Any]] = self.filter_transactions(
-            transactions
-        )
-        sequenced_transactions: List[dict[str, Any]] = self.sequence_transactions(
-            filtered_transactions
-        )
+        # Filtering and counting are fused into a single pass: votes are counted as
+        # they are filtered, with no intermediate lists and no sort by nonce
         vote_counts: dict[str, dict[str, Any]] = self.count_votes(
-            sequenced_transactions
+            self.iter_vote_transactions(self.get_transactions())
         )
         self.save_results(vote_counts)
 
@@ -67,14 +146,18 @@ class VoteCountingPipeline:
 
     def __ensure_required_fields(self, tx: dict[str, Any]) -> bool:
         """Ensure the transaction has all the required fields."""
-        for field in self.REQUIRED_TX_FIELDS:
-            if field not in tx:
-                self.logger.warning(f"Missing field: {field} in transaction: {tx}")
-                return False
-        return True
+        # Set difference against the keys view is done in C, in one call
+        missing = self.REQUIRED_TX_FIELDS_SET - tx.keys()
+        if missing:
+            self.logger.warning(
+                "Missing fields: %s in transaction: %s", ", ".join(sorted(missing)), tx
+            )
+        return not missing
 
-    def get_transactions(self) -> List[dict[str, Any]]:
+    def get_transactions(self) -> Iterable[dict[str, Any]]:
         """Retrieve transactions from the GraphQL Query Aggregator."""
+        if self.stream_transactions:
+            return self.iter_transactions()
         try:
             return self.gqa.retrieve_combined_transactions(
                 self.start_date, self.end_date
@@ -83,154 +166,151 @@ class VoteCountingPipeline:
             self.logger.error(f"Block discontinuity detected: {str(e)}")
             raise  # Re-raise the exception to be handled by the main application
 
-    def filter_transactions(
-        self, transactions: List[dict[str, Any]]
-    ) -> List[dict[str, Any]]:
+    def iter_transactions(self) -> Iterator[dict[str, Any]]:
+        """Lazily stream transactions from the GraphQL Query Aggregator."""
+        try:
+            yield from self.gqa.iter_combined_transactions(
+                self.start_date, self.end_date
+            )
+        except BlockDiscontinuityError as e:
+            self.logger.error(f"Block discontinuity detected: {str(e)}")
+            raise  # Re-raise the exception to be handled by the main application
+
+    def filter_transactions(self, transactions: Iterable[dict[str, Any]]) -> List[Vote]:
         """Filter transactions based on criteria."""
-        filtered: List[dict[str, Any]] = []
-        oldest_date: Optional[datetime] = None
-        most_recent_date: Optional[datetime] = None
+        return list(self.iter_vote_transactions(transactions))
+
+    def iter_vote_transactions(
+        self, transactions: Iterable[dict[str, Any]]
+    ) -> Iterator[Vote]:
+        """Lazily filter transactions based on criteria, yielding the valid votes."""
+        filtered_count: int = 0
+        # Only the oldest and most recent block dates are kept, so that streamed
+        # transactions are not retained
+        oldest_date: int | None = None
+        most_recent_date: int | None = None
+        # Bound to locals so the loop does not look up attributes per transaction
+        burn_address: str = self.config.BURN_ADDRESS
+        start_ms: int = self.start_ms
+        end_ms: int = self.end_ms
 
         for tx in transactions:
-            block_date: datetime = datetime.fromtimestamp(
-                int(tx["blockDate"]) / 1000, tz=timezone.utc
-            )
-
-            if oldest_date is None or block_date < oldest_date:
+            block_date: int = int(tx["blockDate"])
+            if oldest_date is None:
+                oldest_date = most_recent_date = block_date
+            elif block_date < oldest_date:
                 oldest_date = block_date
-            if most_recent_date is None or block_date > most_recent_date:
+            elif block_date > most_recent_date:
                 most_recent_date = block_date
 
-            if "to" not in tx:
-                # Some transactions only have "blockDate"
-                continue
-
+            # Most discriminating checks first: few transactions go to the burn
+            # address. "to" and "kind" are missing from some transactions
             if (
-                tx["to"] == self.config.BURN_ADDRESS
-                and self.start_date <= block_date <= self.end_date
-                and tx["kind"] == "PAYMENT"
-                and self.is_valid_memo(tx["memo"])
+                tx.get("to") != burn_address
+                or tx.get("kind") != "PAYMENT"
+                or not start_ms <= block_date <= end_ms
             ):
-                filtered.append(
-                    {
-                        "id": tx["id"],
-                        "from": tx["from"],
-                        "amount": Decimal(tx["amount"]),
-                        "memo": self.decode_memo(tx["memo"]),
-                        "nonce": int(tx["nonce"]),
-                        "blockDate": tx["blockDate"],
-                    }
+                continue
+
+            # Decode and parse the memo once, both to validate it and to keep it;
+            # the result is cached per distinct memo
+            memo, parsed_vote = _parse_vote_memo(tx["memo"])
+            if parsed_vote is not None:
+                vote, project_id = parsed_vote
+                filtered_count += 1
+                # Accounts vote many times; interning the sender keeps one copy of
+                # each address and lets the counting dicts match keys by identity.
+                # The memo and vote come from the memo cache and are already shared
+                yield Vote(
+                    tx["id"],
+                    sys.intern(tx["from"]),
+                    memo,
+                    vote,
+                    project_id,
+                    int(tx["nonce"]),
+                    tx["blockDate"],
                 )
 
-        if oldest_date is None and most_recent_date is None:
+        if oldest_date is None:
             date_info: str = "No transactions found"
         else:
             date_info: str = (
-                f"Oldest block date: {oldest_date.isoformat() if oldest_date else 'N/A'}, "
-                f"Most recent block date: {most_recent_date.isoformat() if most_recent_date else 'N/A'}"
+                f"Oldest block date: {datetime.fromtimestamp(oldest_date / 1000, tz=timezone.utc).isoformat()}, "
+                f"Most recent block date: {datetime.fromtimestamp(most_recent_date / 1000, tz=timezone.utc).isoformat()}"
             )
 
         self.logger.info(
-            f"Filtered down to {len(filtered)} valid vote transactions. {date_info}"
+            f"Filtered down to {filtered_count} valid vote transactions. {date_info}"
         )
-        return filtered
-
-    def sequence_transactions(
-        self, transactions: List[dict[str, Any]]
-    ) -> List[dict[str, Any]]:
-        """Sequence transactions by nonce for each account."""
-        account_transactions: dict[str, List[dict[str, Any]]] = defaultdict(list)
-
-        for tx in transactions:
-            account_transactions[tx["from"]].append(tx)
-
-        sequenced_transactions: List[dict[str, Any]] = []
-        for account, txs in account_transactions.items():
-            sequenced_transactions.extend(sorted(txs, key=lambda x: x["nonce"]))
-
-        self.logger.info(f"Sequenced {len(sequenced_transactions)} transactions")
-        return sequenced_transactions
 
     def is_valid_memo(self, memo: str) -> bool:
         """Check if the memo is in the correct format."""
-        decoded: str = self.decode_memo(memo)
-        parts: List[str] = decoded.split()
-        is_valid: bool = (
-            len(parts) == 2 and parts[0] in ("yes", "no") and parts[1].isdigit()
-        )
-        self.logger.debug(f"Memo validity check: {is_valid}")
-        return is_valid
+        _, parsed_vote = _parse_vote_memo(memo)
+        return parsed_vote is not None
 
     def decode_memo(self, memo: str) -> str:
         """Decode the Base58Check encoded memo."""
-        self.logger.debug(f"Decoding memo: {memo}")
-
-        try:
-            # Decode from Base58Check
-            decoded: bytes = base58.b58decode_check(memo)
-            self.logger.debug(f"Base58Check decoded: {decoded.hex()}")
-
-            # Check the version byte (should be 0x14)
-            if decoded[0] != 0x14:
-                raise ValueError(f"Invalid memo version byte: {decoded[0]}")
-
-            # Get the length of the message (third byte) --> Docs mention byte 2, but this appears to be incorrect
-            length: int = decoded[2]
-            self.logger.debug(f"Memo length: {length}")
-
-            # Extract the actual message
-            message: str = decoded[3 : 3 + length].decode("utf-8")
-            self.logger.debug(f"Decoded message: {message}")
-            return message
-        except Exception as e:
-            self.logger.error(f"Error decoding memo: {str(e)}")
-            return ""  # Return an empty string if decoding fails
-
-    def count_votes(self, transactions: List[dict[str, Any]]) -> VoteCount:
-        """Count votes from filtered and sequenced transactions."""
-        vote_counts: dict[str, dict[str, Any]] = defaultdict(
-            lambda: {
-                "yes_votes": {"count": 0, "addresses": set()},
-                "no_votes": {"count": 0, "addresses": set()},
-            }
-        )
-
-        # latest votes for each project, per account (yes or no)
-        latest_votes: dict[str, dict[str, str]] = defaultdict(dict)
-
-        for tx in transactions:
-            vote, project_id_str = tx["memo"].split()
-            project_id = str(
-                int(project_id_str)
-            )  # Convert project ID to integer and back to string
-            account = tx["from"]
-
-            # Update the latest vote for this account and project
-            latest_votes[project_id][account] = vote
-
-        # Recalculate vote counts for each project
-        for project_id, votes in latest_votes.items():
-            yes_votes = set(account for account, v in votes.items() if v == "yes")
-            no_votes = set(account for account, v in votes.items() if v == "no")
-
-            vote_counts[project_id] = {
+        decoded, _ = _parse_vote_memo(memo)
+        return decoded
+
+    def count_votes(self, votes: Iterable[Vote]) -> VoteCount:
+        """
+        Count votes from filtered vote transactions.
+
+        Only each account's latest vote on a project, the one with the highest
+        nonce, is counted, so the transactions do not need to be sequenced first.
+        """
+        # latest (nonce, vote) for each (project, account) pair, in one flat dict so
+        # that each vote costs a single lookup; projects are keyed by their integer
+        # ID and only converted to strings for the result
+        latest_votes: dict[tuple[int, str], tuple[int, str]] = {}
+
+        for vote in votes:
+            nonce = vote.nonce
+            key = (vote.project_id, vote.sender)
+
+            # Update the latest vote for this account and project; on equal nonces
+            # the later transaction wins, as it did after a stable sort
+            latest = latest_votes.get(key)
+            if latest is None or nonce >= latest[0]:
+                latest_votes[key] = (nonce, vote.vote)
+
+        # Split the latest votes into each project's yes and no addresses, in a
+        # single walk over the latest votes
+        project_votes: dict[int, tuple[list[str], list[str]]] = {}
+        for (project_id, account), (_, v) in latest_votes.items():
+            buckets = project_votes.get(project_id)
+            if buckets is None:
+                buckets = project_votes[project_id] = ([], [])
+            if v == "yes":
+                buckets[0].append(account)
+            else:
+                buckets[1].append(account)
+
+        vote_counts: dict[str, dict[str, Any]] = {}
+        for project_id, (yes_votes, no_votes) in project_votes.items():
+            # Sorted so that the results do not depend on the order of the votes
+            yes_votes.sort()
+            no_votes.sort()
+
+            vote_counts[str(project_id)] = {
                 "yes_votes": {"count": len(yes_votes), "addresses": yes_votes},
                 "no_votes": {"count": len(no_votes), "addresses": no_votes},
             }
 
-        # Convert sets to lists for JSON serialization
-        for project in vote_counts.values():
-            project["yes_votes"]["addresses"] = list(project["yes_votes"]["addresses"])
-            project["no_votes"]["addresses"] = list(project["no_votes"]["addresses"])
-
         self.logger.info(f"Counted votes for {len(vote_counts)} projects")
-        return dict(vote_counts)
+        return vote_counts
 
     def save_results(
         self, vote_counts: dict[str, dict[str, Any]], output_file: str | None = None
     ) -> None:
         """Save vote counting results to a JSON file."""
         output_file = output_file or self.config.OUTPUT_FILE
-        with open(output_file, "w") as f:
-            json.dump(vote_counts, f, indent=2, default=str)
+        with open(output_file, "wb") as f:
+            f.write(
+                # Sorted keys, like the sorted addresses, keep the file stable
+                serialization.dumps(
+                    serialization.jsonify(vote_counts), indent=True, sort_keys=True
+                )
+            )
         self.logger.info(f"Vote counts saved to {output_file}")
@@ -0,0 +1,359 @@
+"""Tests for the GraphQLQueryAggregator class."""
+
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator
+from unittest.mock import MagicMock
+
+import pytest
+
+from vote_counter import serialization
+from gqa.graphql_query_aggregator import (
+    GraphQLQueryAggregator,
+    BlockDiscontinuityError,
+    to_ms_bounds,
+)
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f%z"
+START_DATE = datetime.strptime("2024-09-01 00:00:00.689550+00:00", DATE_FORMAT)
+END_DATE = datetime.strptime("2024-09-10 23:59:59.999550+00:00", DATE_FORMAT)
+
+
+def load_response(test_case: int) -> dict[str, Any]:
+    with open(f"tests/resources/graphql/response/{test_case}.json", "r") as f:
+        return json.load(f)["data"]
+
+
+@pytest.fixture
+def response_files(tmp_path: Path) -> list[str]:
+    """Fixture writing the raw GraphQL responses in the format stored by the GQA."""
+    paths = []
+    for test_case in (1, 2, 3, 4):
+        path = tmp_path / f"response_{test_case}.json"
+        path.write_text(json.dumps(load_response(test_case)))
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def gqa(tmp_path: Path) -> Iterator[GraphQLQueryAggregator]:
+    """Fixture for creating a GraphQLQueryAggregator backed by a temporary database."""
+    client = MagicMock()
+    client.endpoint = "http://localhost/graphql"
+    with GraphQLQueryAggregator(
+        client, str(tmp_path / "gqa.db"), recent_blocks_to_ignore=0
+    ) as gqa:
+        yield gqa
+
+
+def test_retrieve_and_store_from_file_round_trip(
+    gqa: GraphQLQueryAggregator, response_files: list[str]
+) -> None:
+    # GIVEN
+    expected_transactions = GraphQLQueryAggregator._get_transactions_from_response(
+        [load_response(1)], START_DATE, END_DATE, 0, logger
+    )
+
+    # WHEN
+    gqa.retrieve_and_store_from_file(response_files[0])
+    transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+
+    # THEN
+    assert transactions == expected_transactions
+
+
+def test_retrieve_and_store_from_files(
+    gqa: GraphQLQueryAggregator, response_files: list[str]
+) -> None:
+    # WHEN
+    gqa.retrieve_and_store_from_files(response_files)
+
+    # THEN
+    with sqlite3.connect(gqa.db_path) as conn:
+        endpoints = [
+            row[0]
+            for row in conn.execute(
+                "SELECT endpoint FROM graphql_responses ORDER BY id"
+            )
+        ]
+    assert endpoints == response_files
+
+
+def test_retrieve_and_store_from_file_invalid_json(
+    tmp_path: Path, gqa: GraphQLQueryAggregator
+) -> None:
+    # GIVEN
+    path = tmp_path / "invalid.json"
+    path.write_text('{"bestChain": [')
+
+    # WHEN / THEN
+    with pytest.raises(json.JSONDecodeError):
+        gqa.retrieve_and_store_from_file(str(path))
+
+
+def test_retrieve_combined_transactions_cache_invalidated_on_store(
+    gqa: GraphQLQueryAggregator, response_files: list[str]
+) -> None:
+    # GIVEN
+    gqa.retrieve_and_store_from_file(response_files[0])
+    first_transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+    assert (
+        gqa.retrieve_combined_transactions(START_DATE, END_DATE) == first_transactions
+    )
+    assert gqa._cached_combined_transactions.cache_info().hits == 1
+
+    # WHEN
+    gqa.retrieve_and_store_from_file(response_files[1])
+    transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+
+    # THEN
+    assert len(transactions) > len(first_transactions)
+
+
+def test_retrieve_combined_transactions_returns_copies(
+    gqa: GraphQLQueryAggregator, response_files: list[str]
+) -> None:
+    # GIVEN
+    gqa.retrieve_and_store_from_file(response_files[0])
+    transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+    expected_memo = transactions[0]["memo"]
+
+    # WHEN
+    transactions[0]["memo"] = "MUTATED"
+
+    # THEN the cached transactions are not modified
+    transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+    assert gqa._cached_combined_transactions.cache_info().hits == 1
+    assert transactions[0]["memo"] == expected_memo
+
+
+def create_legacy_db(db_path: str, responses: list[dict[str, Any]]) -> None:
+    """Create a database storing the responses as written before the blocks table."""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            """
+            CREATE TABLE graphql_responses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                execution_timestamp TEXT,
+                response JSON,
+                min_block_timestamp TEXT,
+                max_block_timestamp TEXT,
+                endpoint TEXT
+            )
+        """
+        )
+        for day, response in enumerate(responses, start=11):
+            block_timestamps = [
+                int(block["protocolState"]["blockchainState"]["date"])
+                for block in response["bestChain"]
+            ]
+            conn.execute(
+                "INSERT INTO graphql_responses (execution_timestamp, response, min_block_timestamp, max_block_timestamp, endpoint) VALUES (?, ?, ?, ?, ?)",
+                (
+                    f"2024-09-{day}T00:00:00+00:00",
+                    json.dumps(response),
+                    min(block_timestamps),
+                    max(block_timestamps),
+                    "http://localhost/graphql",
+                ),
+            )
+    conn.close()
+
+
+def test_migrate_legacy_json_responses(tmp_path: Path) -> None:
+    # GIVEN
+    db_path = str(tmp_path / "legacy.db")
+    create_legacy_db(db_path, [load_response(2), load_response(3)])
+    expected_transactions = GraphQLQueryAggregator._get_transactions_from_response(
+        [load_response(2), load_response(3)], START_DATE, END_DATE, 0, logger
+    )
+
+    # WHEN
+    with GraphQLQueryAggregator(MagicMock(), db_path, recent_blocks_to_ignore=0) as gqa:
+        transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+
+    # THEN
+    assert transactions == expected_transactions
+
+
+def test_migrate_fills_gaps_from_older_responses(tmp_path: Path) -> None:
+    # GIVEN a more recent response missing a block that an older one contains
+    db_path = str(tmp_path / "legacy.db")
+    older_response = load_response(1)
+    newer_response = load_response(1)
+    newer_response["bestChain"].pop(100)
+    create_legacy_db(db_path, [older_response, newer_response])
+    expected_transactions = GraphQLQueryAggregator._get_transactions_from_response(
+        [older_response, newer_response], START_DATE, END_DATE, 0, logger
+    )
+
+    # WHEN
+    with GraphQLQueryAggregator(MagicMock(), db_path, recent_blocks_to_ignore=0) as gqa:
+        transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+
+    # THEN
+    assert transactions == expected_transactions
+
+
+def test_retrieve_combined_transactions_prefers_most_recent_response(
+    tmp_path: Path, gqa: GraphQLQueryAggregator, response_files: list[str]
+) -> None:
+    # GIVEN
+    newer_response = load_response(1)
+    newer_response["bestChain"][0]["transactions"]["userCommands"] = []
+    newer_response_file = tmp_path / "newer_response.json"
+    newer_response_file.write_text(json.dumps(newer_response))
+    expected_transactions = GraphQLQueryAggregator._get_transactions_from_response(
+        [newer_response], START_DATE, END_DATE, 0, logger
+    )
+
+    # WHEN
+    gqa.retrieve_and_store_from_files([response_files[0], str(newer_response_file)])
+    transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+
+    # THEN
+    assert transactions == expected_transactions
+
+
+def test_retrieve_combined_transactions_ignores_recent_blocks(
+    tmp_path: Path, response_files: list[str]
+) -> None:
+    # GIVEN
+    gqa = GraphQLQueryAggregator(
+        MagicMock(), str(tmp_path / "recent.db"), recent_blocks_to_ignore=15
+    )
+    expected_transactions = GraphQLQueryAggregator._get_transactions_from_response(
+        [load_response(1)], START_DATE, END_DATE, 15, logger
+    )
+
+    # WHEN
+    with gqa:
+        gqa.retrieve_and_store_from_file(response_files[0])
+        transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+
+    # THEN
+    assert transactions == expected_transactions
+
+
+def test_iter_combined_transactions(
+    gqa: GraphQLQueryAggregator, response_files: list[str]
+) -> None:
+    # GIVEN
+    gqa.retrieve_and_store_from_file(response_files[0])
+    expected_transactions = gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+
+    # WHEN
+    transactions = gqa.iter_combined_transactions(START_DATE, END_DATE)
+
+    # THEN
+    assert list(transactions) == expected_transactions
+
+
+def test_iter_combined_transactions_is_lazy(
+    monkeypatch: pytest.MonkeyPatch,
+    gqa: GraphQLQueryAggregator,
+    response_files: list[str],
+) -> None:
+    # GIVEN
+    gqa.retrieve_and_store_from_file(response_files[0])
+    (block_count,) = gqa._get_conn().execute("SELECT COUNT(*) FROM blocks").fetchone()
+    decoded_blocks = []
+    loads = serialization.loads
+
+    def counting_loads(data: bytes) -> Any:
+        decoded_blocks.append(data)
+        return loads(data)
+
+    monkeypatch.setattr(serialization, "loads", counting_loads)
+    statements = []
+    gqa._get_conn().set_trace_callback(statements.append)
+
+    # WHEN
+    transactions = gqa.iter_combined_transactions(START_DATE, END_DATE)
+    first_transaction = next(transactions)
+
+    # THEN only the blocks up to the first transaction have been decoded
+    assert first_transaction
+    assert 0 < len(decoded_blocks) < block_count
+    # and the blocks are read without sorting them first
+    gqa._get_conn().set_trace_callback(None)
+    (select_blocks,) = [
+        statement
+        for statement in statements
+        if statement.startswith("SELECT height, date, user_commands")
+    ]
+    query_plan = gqa._get_conn().execute(f"EXPLAIN QUERY PLAN {select_blocks}")
+    assert not any("TEMP B-TREE" in row[-1] for row in query_plan)
+
+
+def test_close(gqa: GraphQLQueryAggregator, response_files: list[str]) -> None:
+    # GIVEN
+    gqa.retrieve_and_store_from_file(response_files[0])
+    conn = gqa._get_conn()
+
+    # WHEN
+    gqa.close()
+
+    # THEN the connection is closed, and reopened on the next use
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    assert gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+
+
+def test_retrieve_combined_transactions_block_discontinuity(
+    tmp_path: Path, gqa: GraphQLQueryAggregator
+) -> None:
+    # GIVEN
+    response = load_response(1)
+    missing_block = response["bestChain"].pop(100)
+    missing_height = int(
+        missing_block["protocolState"]["consensusState"]["blockHeight"]
+    )
+    response_file = tmp_path / "discontinuous_response.json"
+    response_file.write_text(json.dumps(response))
+    gqa.retrieve_and_store_from_file(str(response_file))
+
+    # WHEN / THEN
+    with pytest.raises(
+        BlockDiscontinuityError,
+        match=f"{missing_height - 1} to {missing_height + 1}",
+    ):
+        gqa.retrieve_combined_transactions(START_DATE, END_DATE)
+
+
+def test_get_transactions_from_response_block_discontinuity() -> None:
+    # GIVEN
+    response = load_response(1)
+    missing_block = response["bestChain"].pop(100)
+    missing_height = int(
+        missing_block["protocolState"]["consensusState"]["blockHeight"]
+    )
+
+    # WHEN / THEN
+    with pytest.raises(
+        BlockDiscontinuityError,
+        match=f"{missing_height - 1} to {missing_height + 1}",
+    ):
+        GraphQLQueryAggregator._get_transactions_from_response(
+            [response], START_DATE, END_DATE, 0, logger
+        )
+
+
+def test_to_ms_bounds_naive_datetimes() -> None:
+    # GIVEN naive datetimes, which are in local time
+    start_time = datetime(2024, 9, 1, 12, 0, 0, 123000)
+    end_time = datetime(2024, 9, 10, 12, 0, 0, 456999)
+
+    # WHEN
+    bounds = to_ms_bounds(start_time, end_time)
+
+    # THEN
+    assert bounds == (
+        int(start_time.timestamp()) * 1000 + 123,
+        int(end_time.timestamp()) * 1000 + 456,
+    )
@@ -0,0 +1,73 @@
+"""Tests for the serialization module, with and without orjson."""
+
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any
+
+import pytest
+
+from vote_counter import serialization
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> str:
+    """Fixture running a test with orjson and with the standard library json."""
+    if request.param == "json":
+        monkeypatch.setattr(serialization, "orjson", None)
+    else:
+        assert serialization.orjson is not None
+    return request.param
+
+
+def test_dumps_loads_round_trip(backend: str) -> None:
+    # GIVEN
+    obj = {"b": [1, "two", None, True], "a": {"nested": 3}}
+
+    # WHEN
+    data = serialization.dumps(obj)
+
+    # THEN
+    assert isinstance(data, bytes)
+    assert serialization.loads(data) == obj
+    assert serialization.loads(data.decode("utf-8")) == obj
+
+
+def test_dumps_indent_and_sort_keys(backend: str) -> None:
+    # GIVEN
+    obj = {"b": {"d": 1, "c": [2]}, "a": "é"}
+
+    # WHEN
+    data = serialization.dumps(obj, indent=True, sort_keys=True)
+
+    # THEN both backends produce the same document
+    assert data.decode("utf-8") == json.dumps(
+        obj, indent=2, sort_keys=True, ensure_ascii=False
+    )
+
+
+def test_loads_invalid_json(backend: str) -> None:
+    # WHEN / THEN
+    with pytest.raises(json.JSONDecodeError):
+        serialization.loads(b'{"bestChain": [')
+
+
+def test_jsonify() -> None:
+    # GIVEN
+    obj: dict[str, Any] = {
+        "stake": Decimal("1.5"),
+        "voters": {"B62qyes", "B62qabstain"},
+        "date": datetime(2024, 9, 1, tzinfo=timezone.utc),
+        "votes": ({"count": 1},),
+    }
+
+    # WHEN
+    result = serialization.jsonify(obj)
+
+    # THEN
+    assert result == {
+        "stake": "1.5",
+        "voters": ["B62qabstain", "B62qyes"],
+        "date": "2024-09-01T00:00:00+00:00",
+        "votes": [{"count": 1}],
+    }
@@ -0,0 +1,102 @@
+"""Tests for the StakeCountingPipeline class."""
+
+import json
+from decimal import Decimal
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from vote_counter.config import Config
+from vote_counter.stake_counter import StakeCountingPipeline
+
+BALANCES = {
+    "B62qalice": "300",
+    "B62qbob": "100",
+    "B62qcarol": "600",
+}
+TOTAL_SUPPLY = "1000"
+
+
+def execute_query(query: str, variables: dict[str, Any]) -> dict[str, Any]:
+    """Answer the stake counter's total supply query."""
+    return {
+        "bestChain": [
+            {"protocolState": {"consensusState": {"totalCurrency": TOTAL_SUPPLY}}}
+        ]
+    }
+
+
+def execute_document(document: Any, variables: dict[str, Any]) -> dict[str, Any]:
+    """Answer the stake counter's batched balance queries from BALANCES."""
+    return {
+        f"account{name.removeprefix('publicKey')}": {
+            "balance": {"total": BALANCES[address]}
+        }
+        for name, address in variables.items()
+    }
+
+
+@pytest.fixture
+def mock_client() -> MagicMock:
+    """Fixture for mocking the GraphQLClient."""
+    client = MagicMock()
+    client.execute_query.side_effect = execute_query
+    client.execute_document.side_effect = execute_document
+    return client
+
+
+def test_count_stakes(mock_client: MagicMock):
+    # Prepare vote counts where one address voted on both projects
+    vote_counts = {
+        "1": {
+            "yes_votes": {"count": 2, "addresses": ["B62qalice", "B62qbob"]},
+            "no_votes": {"count": 0, "addresses": []},
+        },
+        "2": {
+            "yes_votes": {"count": 1, "addresses": ["B62qcarol"]},
+            "no_votes": {"count": 1, "addresses": ["B62qalice"]},
+        },
+    }
+    pipeline = StakeCountingPipeline(mock_client, Config())
+    pipeline.BALANCE_BATCH_SIZE = 2
+
+    stake_info = pipeline.count_stakes(vote_counts)
+
+    # One query for the total supply and two batched balance queries
+    assert mock_client.execute_query.call_count == 1
+    assert mock_client.execute_document.call_count == 2
+    assert stake_info["1"]["yes_votes"]["stake"]["total"] == Decimal(400)
+    assert stake_info["1"]["yes_votes"]["stake"]["percent"] == Decimal(40)
+    assert stake_info["2"]["no_votes"]["stake"]["addresses"]["B62qalice"] == {
+        "balance": Decimal(300),
+        "percent": Decimal(30),
+    }
+    assert stake_info["2"]["yes_votes"]["stake"]["total"] == Decimal(600)
+    # Percentages keep the exponent of (balance / supply) * 100
+    assert str(stake_info["1"]["yes_votes"]["stake"]["percent"]) == "40.0"
+
+
+def test_save_results_percent_format(tmp_path, mock_client: MagicMock):
+    # Prepare a balance that is a tiny fraction of the total supply
+    vote_counts = {
+        "1": {
+            "yes_votes": {"count": 1, "addresses": ["B62qalice"]},
+            "no_votes": {"count": 1, "addresses": ["B62qdave"]},
+        },
+    }
+    pipeline = StakeCountingPipeline(mock_client, Config())
+    output_file = tmp_path / "vote_stake_info.json"
+
+    with patch.dict(BALANCES, {"B62qdave": "123456789"}):
+        with patch(f"{__name__}.TOTAL_SUPPLY", "10000000000000000000"):
+            stake_info = pipeline.count_stakes(vote_counts)
+    pipeline.save_results(stake_info, str(output_file))
+
+    # Percentages are saved with the same text as (balance / supply) * 100
+    saved = json.loads(output_file.read_text())
+    assert saved["1"]["yes_votes"]["stake"]["addresses"]["B62qalice"] == {
+        "balance": "300",
+        "percent": "3.00E-15",
+    }
+    assert saved["1"]["no_votes"]["stake"]["percent"] == "1.2345678900E-9"
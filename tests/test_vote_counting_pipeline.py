@@ -2,6 +2,7 @@
 
 import json
 from datetime import datetime, timezone
+from decimal import Decimal
 import logging
 from typing import Any, Type
 from unittest.mock import MagicMock, patch
@@ -9,10 +10,12 @@ import pytest
 import pprint
 import itertools
 
+import base58
+
 logger = logging.getLogger(__name__)
 
 from gqa.graphql_query_aggregator import GraphQLQueryAggregator, BlockDiscontinuityError
-from vote_counter.vote_counter import VoteCountingPipeline
+from vote_counter.vote_counter import Vote, VoteCountingPipeline
 from vote_counter.config import Config
 
 
@@ -183,8 +186,9 @@ def test_vote_counting_pipeline(
     # Prepare mock GQA
     mock_gqa.retrieve_combined_transactions.return_value = mock_transactions
 
-    # Run the pipeline
-    vote_counts = vote_counting_pipeline.run()
+    # Run the pipeline, without writing the results to the working directory
+    with patch.object(VoteCountingPipeline, "save_results"):
+        vote_counts = vote_counting_pipeline.run()
 
     # Assert the results
     assert compare_vote_counts(vote_counts, expected_vote_counts), (
@@ -210,6 +214,154 @@ def test_block_discontinuity(mock_gqa: MagicMock, mock_config: Config):
         pipeline.run()
 
 
+def test_block_discontinuity_streamed(mock_gqa: MagicMock, mock_config: Config):
+    # Prepare mock GQA to raise BlockDiscontinuityError once the stream is consumed
+    def iter_combined_transactions(start, end):
+        yield from []
+        raise BlockDiscontinuityError("Test discontinuity")
+
+    mock_gqa.iter_combined_transactions.side_effect = iter_combined_transactions
+
+    # Create a VoteCountingPipeline that streams transactions
+    start_date = datetime(2024, 8, 10, 16, 24, 59, 689550, tzinfo=timezone.utc)
+    end_date = datetime(2024, 9, 10, 20, 24, 59, 689550, tzinfo=timezone.utc)
+    pipeline = VoteCountingPipeline(
+        start_date, end_date, mock_gqa, mock_config, stream_transactions=True
+    )
+
+    # Run the pipeline and expect it to raise BlockDiscontinuityError
+    with pytest.raises(BlockDiscontinuityError):
+        pipeline.run()
+    mock_gqa.retrieve_combined_transactions.assert_not_called()
+
+
+def test_decode_memo(mock_gqa: MagicMock, mock_config: Config):
+    # A memo is the version byte 0x14, a length byte at index 2 and the message,
+    # padded to 34 bytes and Base58Check encoded
+    message = b"yes 1"
+    payload = bytes([0x14, 0x01, len(message)]) + message
+    memo = base58.b58encode_check(payload.ljust(34, b"\x00")).decode("ascii")
+    start_date = datetime(2024, 8, 10, 16, 24, 59, 689550, tzinfo=timezone.utc)
+    end_date = datetime(2024, 9, 10, 20, 24, 59, 689550, tzinfo=timezone.utc)
+    pipeline = VoteCountingPipeline(start_date, end_date, mock_gqa, mock_config)
+
+    assert pipeline.decode_memo(memo) == "yes 1"
+    assert pipeline.decode_memo("not a memo") == ""
+    assert pipeline.is_valid_memo(memo)
+    assert not pipeline.is_valid_memo("not a memo")
+
+
+def test_filter_transactions(mock_gqa: MagicMock, mock_config: Config):
+    # Prepare a vote and transactions that are not votes
+    message = b"no 7"
+    payload = bytes([0x14, 0x01, len(message)]) + message
+    memo = base58.b58encode_check(payload.ljust(34, b"\x00")).decode("ascii")
+    start_date = datetime(2024, 8, 10, 16, 24, 59, 689550, tzinfo=timezone.utc)
+    end_date = datetime(2024, 9, 10, 20, 24, 59, 689550, tzinfo=timezone.utc)
+    block_date = int(start_date.timestamp() * 1000) + 1
+    vote = {
+        "id": "1",
+        "to": mock_config.BURN_ADDRESS,
+        "from": "B62qalice",
+        "memo": memo,
+        "nonce": "3",
+        "kind": "PAYMENT",
+        "blockDate": block_date,
+    }
+    transactions = [
+        vote,
+        {**vote, "id": "2", "to": "B62qbob"},
+        {**vote, "id": "3", "memo": "not a memo"},
+        {**vote, "id": "4", "blockDate": block_date - 2},
+    ]
+    pipeline = VoteCountingPipeline(start_date, end_date, mock_gqa, mock_config)
+
+    votes = pipeline.filter_transactions(transactions)
+
+    assert votes == [Vote("1", "B62qalice", "no 7", "no", 7, 3, block_date)]
+
+
+def test_count_votes_latest_nonce_wins(mock_gqa: MagicMock, mock_config: Config):
+    # Prepare votes that are not in nonce order
+    votes = [
+        Vote("1", "B62qalice", "no 1", "no", 1, 5, 0),
+        Vote("2", "B62qalice", "yes 1", "yes", 1, 3, 0),
+        Vote("3", "B62qbob", "yes 1", "yes", 1, 1, 0),
+        Vote("4", "B62qbob", "no 2", "no", 2, 2, 0),
+    ]
+    start_date = datetime(2024, 8, 10, 16, 24, 59, 689550, tzinfo=timezone.utc)
+    end_date = datetime(2024, 9, 10, 20, 24, 59, 689550, tzinfo=timezone.utc)
+    pipeline = VoteCountingPipeline(start_date, end_date, mock_gqa, mock_config)
+
+    vote_counts = pipeline.count_votes(votes)
+
+    # Each account's vote with the highest nonce is the one counted
+    assert vote_counts == {
+        "1": {
+            "yes_votes": {"count": 1, "addresses": ["B62qbob"]},
+            "no_votes": {"count": 1, "addresses": ["B62qalice"]},
+        },
+        "2": {
+            "yes_votes": {"count": 0, "addresses": []},
+            "no_votes": {"count": 1, "addresses": ["B62qbob"]},
+        },
+    }
+
+
+def test_count_votes_sorts_addresses(mock_gqa: MagicMock, mock_config: Config):
+    # Prepare votes whose senders are not in address order
+    votes = [
+        Vote("1", "B62qcarol", "yes 1", "yes", 1, 1, 0),
+        Vote("2", "B62qalice", "yes 1", "yes", 1, 1, 0),
+        Vote("3", "B62qbob", "yes 1", "yes", 1, 1, 0),
+    ]
+    start_date = datetime(2024, 8, 10, 16, 24, 59, 689550, tzinfo=timezone.utc)
+    end_date = datetime(2024, 9, 10, 20, 24, 59, 689550, tzinfo=timezone.utc)
+    pipeline = VoteCountingPipeline(start_date, end_date, mock_gqa, mock_config)
+
+    vote_counts = pipeline.count_votes(votes)
+
+    assert vote_counts["1"]["yes_votes"]["addresses"] == [
+        "B62qalice",
+        "B62qbob",
+        "B62qcarol",
+    ]
+
+
+def test_save_results(tmp_path, mock_gqa: MagicMock, mock_config: Config):
+    # Prepare vote counts including a value JSON cannot represent natively
+    vote_counts = {
+        "1": {
+            "yes_votes": {"count": 1, "addresses": ["B62qyes"]},
+            "no_votes": {"count": 0, "addresses": []},
+            "stake": Decimal("1.5"),
+            "voters": {"B62qyes", "B62qabstain"},
+        }
+    }
+    output_file = tmp_path / "vote_counts.json"
+    start_date = datetime(2024, 8, 10, 16, 24, 59, 689550, tzinfo=timezone.utc)
+    end_date = datetime(2024, 9, 10, 20, 24, 59, 689550, tzinfo=timezone.utc)
+    pipeline = VoteCountingPipeline(start_date, end_date, mock_gqa, mock_config)
+
+    pipeline.save_results(vote_counts, str(output_file))
+
+    # Decimals are saved as strings and sets as sorted lists
+    assert load_json_file(str(output_file)) == {
+        "1": {
+            **vote_counts["1"],
+            "stake": "1.5",
+            "voters": ["B62qabstain", "B62qyes"],
+        }
+    }
+    # Keys are saved in sorted order
+    assert list(load_json_file(str(output_file))["1"]) == [
+        "no_votes",
+        "stake",
+        "voters",
+        "yes_votes",
+    ]
+
+
 def test_incremental_vote_aggregation(
     mock_config: Config,
     mock_gqa: MagicMock,